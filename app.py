@@ -3,12 +3,27 @@ import google.generativeai as genai
 import random
 import time
 import json
+import logging
+import os
+import pickle
+import shutil
+import struct
+import threading
+import zlib
+import uuid
 from datetime import datetime
+import numpy as np
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 import plotly.graph_objects as go
 import plotly.express as px
 from typing import List, Dict, Any
 import re
 
+logger = logging.getLogger(__name__)
+
 # Configure page
 st.set_page_config(
     page_title="🎮 Gemini Nexus",
@@ -119,6 +134,7 @@ st.markdown("""
     
     .status-online { background-color: #4CAF50; }
     .status-thinking { background-color: #FF9800; }
+    .status-degraded { background-color: #FFC107; }
     .status-offline { background-color: #f44336; }
     
     /* Animated elements */
@@ -147,10 +163,283 @@ def initialize_gemini():
         st.error(f"Failed to initialize Gemini AI: {str(e)}")
         return None
 
+# Backend Health
+class BackendHealthMonitor:
+    """Tracks time to first token and error rate as EWMAs from real and probe calls"""
+    ALPHA = 0.2
+    PROBE_INTERVAL = 60.0
+    MAX_PROBE_INTERVAL = 15 * 60.0
+    # Stop probing once no real request has arrived for this long
+    APP_IDLE_TIMEOUT = 30 * 60.0
+    # Time to first token does not grow with reply length, so probes and long
+    # replies are comparable and the degraded output cap cannot feed back into it
+    DEGRADED_ENTER_TTFT = 4.0
+    DEGRADED_EXIT_TTFT = 2.0
+    # Well above ALPHA so a single failed call cannot mark the backend degraded
+    DEGRADED_ENTER_ERROR_RATE = 0.35
+    DEGRADED_EXIT_ERROR_RATE = 0.1
+    OFFLINE_ERROR_RATE = 0.6
+    OFFLINE_CONSECUTIVE_FAILURES = 3
+    DEGRADED_MAX_OUTPUT_TOKENS = 256
+
+    def __init__(self, model):
+        self.model = model
+        self.ttft_ewma = None
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.samples = 0
+        self.last_call = 0.0
+        self.last_use = time.monotonic()
+        self.degraded = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="gemini-health", daemon=True)
+
+    def start(self):
+        """Start the background warmup and probe loop"""
+        self._thread.start()
+
+    def record(self, ttft: float, ok: bool, probe: bool = False):
+        """Fold one backend call into the time-to-first-token and error-rate EWMAs"""
+        with self._lock:
+            self.samples += 1
+            self.last_call = time.monotonic()
+            if not probe:
+                self.last_use = self.last_call
+            self.error_rate += self.ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+            if ok:
+                self.consecutive_failures = 0
+                if self.ttft_ewma is None:
+                    self.ttft_ewma = ttft
+                else:
+                    self.ttft_ewma += self.ALPHA * (ttft - self.ttft_ewma)
+            else:
+                self.consecutive_failures += 1
+            ttft_ewma = self.ttft_ewma or 0.0
+            if self.degraded:
+                self.degraded = (ttft_ewma > self.DEGRADED_EXIT_TTFT
+                                 or self.error_rate > self.DEGRADED_EXIT_ERROR_RATE)
+            else:
+                self.degraded = (ttft_ewma >= self.DEGRADED_ENTER_TTFT
+                                 or self.error_rate >= self.DEGRADED_ENTER_ERROR_RATE)
+
+    def _status(self):
+        if self.samples == 0:
+            return "warming"
+        if (self.consecutive_failures >= self.OFFLINE_CONSECUTIVE_FAILURES
+                or self.error_rate >= self.OFFLINE_ERROR_RATE):
+            return "offline"
+        return "degraded" if self.degraded else "online"
+
+    def status(self):
+        """Return one of warming, online, degraded or offline"""
+        with self._lock:
+            return self._status()
+
+    def snapshot(self):
+        """Return status, time to first token and error rate read under one lock"""
+        with self._lock:
+            return {
+                "status": self._status(),
+                "ttft": self.ttft_ewma,
+                "error_rate": self.error_rate,
+            }
+
+    def output_token_limit(self, degraded_limit: int = None):
+        """Return no limit while healthy, or the caller's degraded limit when the backend is struggling"""
+        if self.status() in ("degraded", "offline"):
+            return degraded_limit or self.DEGRADED_MAX_OUTPUT_TOKENS
+        return None
+
+    def _probe(self):
+        start = time.monotonic()
+        try:
+            response = self.model.generate_content(
+                "Reply with OK.",
+                generation_config={"max_output_tokens": 1},
+                stream=True
+            )
+            ttft = None
+            for _ in response:
+                if ttft is None:
+                    ttft = time.monotonic() - start
+            self.record(ttft if ttft is not None else time.monotonic() - start, True, probe=True)
+        except Exception:
+            self.record(time.monotonic() - start, False, probe=True)
+
+    def _run(self):
+        # Warmup primes the connection before the first real request
+        self._probe()
+        interval = self.PROBE_INTERVAL
+        while True:
+            time.sleep(interval)
+            with self._lock:
+                now = time.monotonic()
+                idle = now - self.last_call
+                unused = now - self.last_use
+            if unused >= self.APP_IDLE_TIMEOUT:
+                interval = self.PROBE_INTERVAL
+                continue
+            if idle >= interval:
+                self._probe()
+            # Back off exponentially while the backend is down
+            if self.status() == "offline":
+                interval = min(interval * 2, self.MAX_PROBE_INTERVAL)
+            else:
+                interval = self.PROBE_INTERVAL
+
+@st.cache_resource
+def get_health_monitor():
+    """Start the backend health monitor once per process"""
+    model = initialize_gemini()
+    if model is None:
+        return None
+    monitor = BackendHealthMonitor(model)
+    monitor.start()
+    return monitor
+
+def output_token_limit(degraded_limit: int):
+    """Return the output limit a view should use, given its budget for a degraded backend"""
+    monitor = get_health_monitor()
+    return monitor.output_token_limit(degraded_limit) if monitor else None
+
+def generate_content(model, prompt: str, max_output_tokens: int = None):
+    """Call the model and report time to first token to the health monitor"""
+    generation_config = None
+    if max_output_tokens:
+        generation_config = {"max_output_tokens": max_output_tokens}
+        # Ask for brevity so a capped reply still ends inside the required format
+        prompt += (f"\n\nThe service is busy: keep the whole reply under "
+                   f"{max_output_tokens * 3 // 4} words and keep the exact format requested above.")
+    monitor = get_health_monitor()
+    start = time.monotonic()
+    ttft = None
+    try:
+        response = model.generate_content(prompt, generation_config=generation_config, stream=True)
+        for _ in response:
+            if ttft is None:
+                ttft = time.monotonic() - start
+    except Exception:
+        if monitor:
+            monitor.record(time.monotonic() - start, False)
+        raise
+    if monitor:
+        monitor.record(ttft if ttft is not None else time.monotonic() - start, True)
+    return response
+
+# Session Analytics
+GAME_TYPES = ["Story Adventure", "Riddle Master", "Role Play Chat", "Word Association"]
+DATA_DIR = os.environ.get("GEMINI_NEXUS_DATA_DIR", ".nexus_data")
+
+class SessionAnalytics:
+    """Append-only event log of fixed-size records with vectorized aggregations"""
+    EVENT_DTYPE = np.dtype([
+        ("timestamp", "<f8"),
+        ("session_id", "<u8"),
+        ("game", "u1"),
+        ("score_delta", "<i4"),
+        ("latency", "<f4"),
+    ])
+
+    def __init__(self, path: str):
+        self.path = path
+        self.events_path = os.path.join(path, "events.bin")
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def log_event(self, session_id: int, game_type: str, score_delta: int, latency: float = None):
+        """Append one event as a single record; latency is None for turns without a backend call"""
+        record = np.array([(
+            time.time(),
+            session_id,
+            GAME_TYPES.index(game_type),
+            score_delta,
+            np.nan if latency is None else latency,
+        )], dtype=self.EVENT_DTYPE).tobytes()
+        with self._lock, open(self.events_path, "ab") as f:
+            # flock serializes writers across server processes; the lock above covers threads
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            # Drop a torn tail left by a crashed writer so records stay aligned
+            size = os.fstat(f.fileno()).st_size
+            if size % self.EVENT_DTYPE.itemsize:
+                f.truncate(size - size % self.EVENT_DTYPE.itemsize)
+            f.write(record)
+
+    def size(self):
+        """Current log size in bytes, used as the cache key for aggregations"""
+        return os.path.getsize(self.events_path) if os.path.exists(self.events_path) else 0
+
+    def load(self, size: int = None):
+        """Read complete records, up to size bytes if given, as a structured array"""
+        if size is None:
+            size = self.size()
+        count = size // self.EVENT_DTYPE.itemsize
+        if not count:
+            return np.empty(0, dtype=self.EVENT_DTYPE)
+        return np.fromfile(self.events_path, dtype=self.EVENT_DTYPE, count=count)
+
+    @staticmethod
+    def leaderboard(data, limit: int = 10):
+        """Top (session, game) pairs by total score"""
+        if not len(data):
+            return []
+        pairs, inverse = np.unique(data[["session_id", "game"]], return_inverse=True)
+        totals = np.bincount(inverse.ravel(), weights=data["score_delta"])
+        order = np.argsort(totals)[::-1][:limit]
+        return [{
+            "session": f"{int(pairs['session_id'][i]):016x}"[:8],
+            "game": GAME_TYPES[pairs["game"][i]],
+            "score": int(totals[i]),
+        } for i in order]
+
+    @staticmethod
+    def game_averages(data):
+        """Turn count, mean score per turn and mean backend latency for each game"""
+        n = len(GAME_TYPES)
+        turns = np.bincount(data["game"], minlength=n)
+        scores = np.bincount(data["game"], weights=data["score_delta"], minlength=n)
+        timed = np.isfinite(data["latency"])
+        timed_turns = np.bincount(data["game"][timed], minlength=n)
+        latencies = np.bincount(data["game"][timed], weights=data["latency"][timed], minlength=n)
+        return {
+            "game": GAME_TYPES,
+            "turns": turns,
+            "avg_score": scores / np.maximum(turns, 1),
+            "avg_latency": np.where(timed_turns > 0, latencies / np.maximum(timed_turns, 1), np.nan),
+        }
+
+    @staticmethod
+    def daily_series(data):
+        """Events and total score per calendar day (UTC)"""
+        days = (data["timestamp"] // 86400).astype(np.int64)
+        unique_days, inverse = np.unique(days, return_inverse=True)
+        return {
+            "day": unique_days.astype("datetime64[D]"),
+            "events": np.bincount(inverse, minlength=len(unique_days)),
+            "score": np.bincount(inverse, weights=data["score_delta"], minlength=len(unique_days)),
+        }
+
+@st.cache_resource
+def get_session_analytics():
+    """Open the analytics log once per process"""
+    return SessionAnalytics(os.path.join(DATA_DIR, "analytics"))
+
+@st.cache_data(max_entries=1)
+def summarize_analytics(size: int):
+    """Aggregate the log once per size, so reruns without new events skip the read"""
+    analytics = get_session_analytics()
+    events = analytics.load(size)
+    return {
+        "series": analytics.daily_series(events),
+        "averages": analytics.game_averages(events),
+        "leaderboard": analytics.leaderboard(events),
+    }
+
 # Game Classes
 class GameSession:
     def __init__(self, game_type: str):
         self.game_type = game_type
+        self.session_id = uuid.uuid4().int >> 64
         self.start_time = datetime.now()
         self.messages = []
         self.score = 0
@@ -163,6 +452,18 @@ class GameSession:
             "content": content,
             "timestamp": datetime.now()
         })
+        
+    def record_turn(self, game_type: str, score_delta: int = 0, latency: float = None):
+        """Apply a score change and log the turn to the analytics store"""
+        self.score += score_delta
+        get_session_analytics().log_event(self.session_id, game_type, score_delta, latency)
+        
+    def trim_history(self):
+        """Remove the older half of the message log and return it"""
+        cut = len(self.messages) // 2
+        dropped = {"messages": self.messages[:cut]}
+        self.messages = self.messages[cut:]
+        return dropped
 
 class StoryAdventure:
     def __init__(self, model):
@@ -171,7 +472,7 @@ class StoryAdventure:
         self.player_choices = []
         self.current_scene = 1
         
-    def generate_scene(self, user_input: str = None):
+    def generate_scene(self, user_input: str = None, max_output_tokens: int = None):
         """Generate next story scene based on user input"""
         if not user_input:
             prompt = f"""You are a master storyteller creating an interactive adventure game. 
@@ -199,12 +500,18 @@ class StoryAdventure:
             C) [Choice 3]"""
             
         try:
-            response = self.model.generate_content(prompt)
+            response = generate_content(self.model, prompt, max_output_tokens)
             self.story_context += f"\n{response.text}"
             self.current_scene += 1
             return response.text
         except Exception as e:
             return f"Error generating story: {str(e)}"
+            
+    def trim_history(self):
+        """Drop the older half of the story context; it only feeds the prompt, so nothing is archived"""
+        self.story_context = self.story_context[len(self.story_context) // 2:]
+        self.player_choices = self.player_choices[len(self.player_choices) // 2:]
+        return {}
 
 class RiddleMaster:
     def __init__(self, model):
@@ -214,7 +521,7 @@ class RiddleMaster:
         self.hints_used = 0
         self.difficulty = "medium"
         
-    def generate_riddle(self, difficulty: str = "medium"):
+    def generate_riddle(self, difficulty: str = "medium", max_output_tokens: int = None):
         """Generate a new riddle based on difficulty"""
         self.difficulty = difficulty
         self.hints_used = 0
@@ -230,7 +537,7 @@ class RiddleMaster:
         HINT3: [Final hint]"""
         
         try:
-            response = self.model.generate_content(prompt)
+            response = generate_content(self.model, prompt, max_output_tokens)
             lines = response.text.split('\n')
             
             for line in lines:
@@ -268,7 +575,7 @@ class RolePlayChat:
         self.scenario = scenario
         self.conversation_history = []
         
-    def chat(self, user_message: str):
+    def chat(self, user_message: str, max_output_tokens: int = None):
         """Continue roleplay conversation"""
         prompt = f"""You are roleplaying as {self.character} in this scenario: {self.scenario}
         
@@ -279,7 +586,7 @@ class RolePlayChat:
         Respond in character, staying true to the personality and scenario. Be engaging and interactive."""
         
         try:
-            response = self.model.generate_content(prompt)
+            response = generate_content(self.model, prompt, max_output_tokens)
             self.conversation_history.append({
                 "user": user_message,
                 "ai": response.text,
@@ -288,6 +595,13 @@ class RolePlayChat:
             return response.text
         except Exception as e:
             return f"Error in roleplay: {str(e)}"
+            
+    def trim_history(self):
+        """Remove the older half of the conversation and return it"""
+        cut = len(self.conversation_history) // 2
+        dropped = {"conversation_history": self.conversation_history[:cut]}
+        self.conversation_history = self.conversation_history[cut:]
+        return dropped
 
 class WordGame:
     def __init__(self, model):
@@ -297,24 +611,24 @@ class WordGame:
         self.score = 0
         self.attempts = 0
         
-    def start_word_association(self):
+    def start_word_association(self, max_output_tokens: int = None):
         """Start a word association game"""
         prompt = "Give me a random word to start a word association game. Just respond with one word."
         try:
-            response = self.model.generate_content(prompt)
+            response = generate_content(self.model, prompt, max_output_tokens)
             self.current_word = response.text.strip().lower()
             return self.current_word
         except Exception as e:
             return "error"
             
-    def check_association(self, user_word: str):
+    def check_association(self, user_word: str, max_output_tokens: int = None):
         """Check if user's word is associated with current word"""
         prompt = f"""Are the words "{self.current_word}" and "{user_word}" reasonably associated? 
         Consider synonyms, categories, rhymes, or logical connections.
         Respond with just YES or NO, then explain briefly."""
         
         try:
-            response = self.model.generate_content(prompt)
+            response = generate_content(self.model, prompt, max_output_tokens)
             is_valid = "YES" in response.text.upper()
             self.current_word = user_word.lower()
             if is_valid:
@@ -324,6 +638,281 @@ class WordGame:
         except Exception as e:
             return False, f"Error checking association: {str(e)}"
 
+# Per-Session Game State
+SESSION_MEMORY_CAP = int(os.environ.get("GEMINI_NEXUS_SESSION_MEMORY_CAP", 2 * 1024 * 1024))
+SESSION_IDLE_TIMEOUT = float(os.environ.get("GEMINI_NEXUS_SESSION_IDLE_TIMEOUT", 15 * 60))
+SESSION_SPILL_TTL = float(os.environ.get("GEMINI_NEXUS_SESSION_SPILL_TTL", 24 * 60 * 60))
+SESSION_SWEEP_INTERVAL = 60.0
+
+GAME_FACTORIES = {
+    "story_game": StoryAdventure,
+    "riddle_game": RiddleMaster,
+    "roleplay_game": RolePlayChat,
+    "word_game": WordGame,
+}
+GAME_KEYS = {
+    "Story Adventure": "story_game",
+    "Riddle Master": "riddle_game",
+    "Role Play Chat": "roleplay_game",
+    "Word Association": "word_game",
+}
+GAME_CLASSES = {cls.__name__: cls for cls in [GameSession, *GAME_FACTORIES.values()]}
+
+class SessionStateStore:
+    """Accounts per-session game memory and spills idle sessions to disk"""
+    HISTORY_CHUNK_HEADER = struct.Struct("<I")
+
+    def __init__(self, path: str, memory_cap: int, idle_timeout: float, spill_ttl: float):
+        self.path = path
+        self.memory_cap = memory_cap
+        self.idle_timeout = idle_timeout
+        self.spill_ttl = spill_ttl
+        self._sessions = {}
+        self._session_locks = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="session-sweeper", daemon=True)
+        os.makedirs(path, exist_ok=True)
+
+    def start(self):
+        """Start the background idle-eviction and purge loop"""
+        self._thread.start()
+
+    def _session_lock(self, session_key: str):
+        # Per-session locks keep one user's pickling from blocking everyone else
+        with self._lock:
+            return self._session_locks.setdefault(session_key, threading.RLock())
+
+    def _spill_path(self, session_key: str, name: str):
+        return os.path.join(self.path, session_key, f"{name}.pkl.z")
+
+    def _history_path(self, session_key: str, name: str):
+        return os.path.join(self.path, session_key, f"{name}.history")
+
+    @staticmethod
+    def _state(obj):
+        state = dict(obj.__dict__)
+        state.pop("model", None)
+        return state
+
+    @staticmethod
+    def _quarantine(path: str, error: Exception):
+        logger.warning("Discarding unreadable session file %s: %s", path, error)
+        try:
+            os.replace(path, path + ".corrupt")
+        except OSError:
+            pass
+
+    def size_of(self, obj):
+        """Approximate footprint of a game object, model excluded"""
+        return len(pickle.dumps(self._state(obj), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def attach(self, session_key: str, games: dict):
+        """Mark a session as active"""
+        with self._lock:
+            self._sessions[session_key] = {"games": games, "last_seen": time.monotonic()}
+
+    def _spill(self, session_key: str, games: dict, name: str):
+        obj = games.pop(name, None)
+        if obj is None:
+            return
+        payload = (type(obj).__name__, self._state(obj))
+        path = self._spill_path(session_key, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write beside the target and rename so a crash never leaves a partial spill
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)))
+        os.replace(tmp_path, path)
+
+    def _history_chunks(self, f):
+        """Return (offset, length) of every complete archive chunk and the end of the last one"""
+        header = self.HISTORY_CHUNK_HEADER
+        size = os.fstat(f.fileno()).st_size
+        chunks = []
+        offset = 0
+        while offset + header.size <= size:
+            f.seek(offset)
+            (length,) = header.unpack(f.read(header.size))
+            if offset + header.size + length > size:
+                break
+            chunks.append((offset + header.size, length))
+            offset += header.size + length
+        return chunks, offset
+
+    def _archive(self, session_key: str, name: str, dropped: dict):
+        path = self._history_path(session_key, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        blob = zlib.compress(pickle.dumps(dropped, protocol=pickle.HIGHEST_PROTOCOL))
+        with open(path, "ab+") as f:
+            # Drop a torn chunk left by a crash so the new one stays readable
+            _, end = self._history_chunks(f)
+            f.truncate(end)
+            f.write(self.HISTORY_CHUNK_HEADER.pack(len(blob)) + blob)
+
+    def load(self, session_key: str, games: dict, name: str, factory=None, model=None):
+        """Return a game object, rehydrating it from disk or creating it with factory if needed"""
+        with self._session_lock(session_key):
+            if name in games:
+                return games[name]
+            obj = None
+            path = self._spill_path(session_key, name)
+            if os.path.exists(path):
+                try:
+                    with open(path, "rb") as f:
+                        class_name, state = pickle.loads(zlib.decompress(f.read()))
+                    obj = GAME_CLASSES[class_name].__new__(GAME_CLASSES[class_name])
+                    obj.__dict__.update(state)
+                    if class_name in {cls.__name__ for cls in GAME_FACTORIES.values()}:
+                        obj.model = model
+                    os.remove(path)
+                except Exception as e:
+                    self._quarantine(path, e)
+                    obj = None
+            if obj is None and factory is not None:
+                obj = factory()
+            if obj is not None:
+                games[name] = obj
+            return obj
+
+    def put(self, session_key: str, games: dict, name: str, obj):
+        """Replace a game object, forgetting any spilled copy and archived history"""
+        with self._session_lock(session_key):
+            for path in (self._spill_path(session_key, name), self._history_path(session_key, name)):
+                if os.path.exists(path):
+                    os.remove(path)
+            games[name] = obj
+
+    def has_archive(self, session_key: str, name: str):
+        """Whether any history was archived for a game object"""
+        return os.path.exists(self._history_path(session_key, name))
+
+    def archived_history(self, session_key: str, name: str, field: str, max_chunks: int = 4):
+        """Return the most recently archived history of a game object, oldest first"""
+        path = self._history_path(session_key, name)
+        history = None
+        with self._session_lock(session_key):
+            if not os.path.exists(path):
+                return None
+            try:
+                with open(path, "rb") as f:
+                    chunks, _ = self._history_chunks(f)
+                    for offset, length in chunks[-max_chunks:]:
+                        f.seek(offset)
+                        chunk = pickle.loads(zlib.decompress(f.read(length)))
+                        history = chunk[field] if history is None else history + chunk[field]
+            except Exception as e:
+                self._quarantine(path, e)
+                return None
+        return history
+
+    def enforce_cap(self, session_key: str, games: dict, active: tuple):
+        """Keep a session under the memory cap and return its usage in bytes
+
+        Inactive games are spilled first, then the largest active game has its
+        oldest history moved to the on-disk archive until the session fits.
+        """
+        with self._session_lock(session_key):
+            sizes = {name: self.size_of(obj) for name, obj in games.items()}
+            if sum(sizes.values()) <= self.memory_cap:
+                return sum(sizes.values())
+            for name in [name for name in games if name not in active]:
+                self._spill(session_key, games, name)
+                del sizes[name]
+            trimmable = {name for name in sizes if hasattr(games[name], "trim_history")}
+            while trimmable and sum(sizes.values()) > self.memory_cap:
+                name = max(trimmable, key=sizes.get)
+                dropped = games[name].trim_history()
+                if dropped and any(dropped.values()):
+                    self._archive(session_key, name, dropped)
+                size = self.size_of(games[name])
+                if size >= sizes[name]:
+                    trimmable.discard(name)
+                sizes[name] = size
+            return sum(sizes.values())
+
+    def evict_idle(self):
+        """Spill every session idle past the timeout and purge stale spill directories"""
+        now = time.monotonic()
+        with self._lock:
+            idle = [session_key for session_key, entry in self._sessions.items()
+                    if now - entry["last_seen"] >= self.idle_timeout]
+        for session_key in idle:
+            with self._session_lock(session_key):
+                # The user may have come back since the idle list was built
+                with self._lock:
+                    entry = self._sessions.get(session_key)
+                    if entry is None or time.monotonic() - entry["last_seen"] < self.idle_timeout:
+                        continue
+                    del self._sessions[session_key]
+                for name in list(entry["games"]):
+                    self._spill(session_key, entry["games"], name)
+        for session_key in os.listdir(self.path):
+            session_dir = os.path.join(self.path, session_key)
+            try:
+                expired = time.time() - os.path.getmtime(session_dir) > self.spill_ttl
+            except OSError:
+                continue
+            with self._lock:
+                if session_key in self._sessions:
+                    continue
+                if expired:
+                    shutil.rmtree(session_dir, ignore_errors=True)
+                    self._session_locks.pop(session_key, None)
+        # Locks of sessions that were evicted without spilling anything
+        with self._lock:
+            for session_key in list(self._session_locks):
+                if (session_key not in self._sessions
+                        and not os.path.exists(os.path.join(self.path, session_key))):
+                    del self._session_locks[session_key]
+
+    def _run(self):
+        while True:
+            time.sleep(SESSION_SWEEP_INTERVAL)
+            try:
+                self.evict_idle()
+            except Exception:
+                logger.exception("Session sweeper failed")
+
+@st.cache_resource
+def get_session_store():
+    """Open the per-session game state store and start its sweeper once per process"""
+    store = SessionStateStore(os.path.join(DATA_DIR, "sessions"), SESSION_MEMORY_CAP,
+                              SESSION_IDLE_TIMEOUT, SESSION_SPILL_TTL)
+    store.start()
+    return store
+
+def get_game(name: str):
+    """Return this session's game object, creating or rehydrating it on first use"""
+    model = initialize_gemini()
+    return get_session_store().load(st.session_state.session_key, st.session_state.games, name,
+                                    factory=lambda: GAME_FACTORIES[name](model), model=model)
+
+def get_game_session(game_type: str = None):
+    """Return the current GameSession, starting one for game_type if there is none"""
+    factory = (lambda: GameSession(game_type)) if game_type else None
+    return get_session_store().load(st.session_state.session_key, st.session_state.games,
+                                    "game_session", factory=factory)
+
+def has_archived_history(name: str):
+    """Whether one of this session's game objects has history on disk"""
+    return get_session_store().has_archive(st.session_state.session_key, name)
+
+def get_archived_history(name: str, field: str):
+    """Return recent history trimmed from one of this session's game objects"""
+    return get_session_store().archived_history(st.session_state.session_key, name, field) or []
+
+def start_game_session(game_type: str):
+    """Replace the current GameSession with a fresh one"""
+    get_session_store().put(st.session_state.session_key, st.session_state.games,
+                            "game_session", GameSession(game_type))
+
+# Output budgets per view when the backend is degraded, sized to fit each reply format
+STORY_DEGRADED_TOKENS = 400
+RIDDLE_DEGRADED_TOKENS = 200
+ROLEPLAY_DEGRADED_TOKENS = 200
+WORD_START_DEGRADED_TOKENS = 16
+WORD_CHECK_DEGRADED_TOKENS = 96
+
 # Main App
 def main():
     st.markdown('<h1 class="game-title">🎮 Gemini Nexus: AI Interactive Playground</h1>', 
@@ -334,20 +923,15 @@ def main():
     if not model:
         st.error("Cannot start app without Gemini AI connection.")
         st.stop()
+    health = get_health_monitor()
     
-    # Initialize session state
-    if 'game_session' not in st.session_state:
-        st.session_state.game_session = None
-    if 'story_game' not in st.session_state:
-        st.session_state.story_game = StoryAdventure(model)
-    if 'riddle_game' not in st.session_state:
-        st.session_state.riddle_game = RiddleMaster(model)
-    if 'roleplay_game' not in st.session_state:
-        st.session_state.roleplay_game = RolePlayChat(model)
-    if 'word_game' not in st.session_state:
-        st.session_state.word_game = WordGame(model)
-    if 'ai_status' not in st.session_state:
-        st.session_state.ai_status = "online"
+    # Initialize session state; game objects are created lazily by get_game
+    if 'session_key' not in st.session_state:
+        st.session_state.session_key = uuid.uuid4().hex
+    if 'games' not in st.session_state:
+        st.session_state.games = {}
+    store = get_session_store()
+    store.attach(st.session_state.session_key, st.session_state.games)
     
     # Sidebar Controls
     with st.sidebar:
@@ -356,14 +940,20 @@ def main():
         # AI Status
         status_color = {
             "online": "status-online",
-            "thinking": "status-thinking", 
+            "warming": "status-thinking thinking",
+            "degraded": "status-degraded",
             "offline": "status-offline"
         }
+        health_snapshot = health.snapshot()
+        ai_status = health_snapshot["status"]
+        ttft = health_snapshot["ttft"]
+        latency = f"{ttft * 1000:.0f} ms" if ttft is not None else "n/a"
         
         st.markdown(f"""
         <div style="margin: 10px 0;">
-            <span class="status-indicator {status_color[st.session_state.ai_status]}"></span>
-            AI Status: {st.session_state.ai_status.title()}
+            <span class="status-indicator {status_color[ai_status]}"></span>
+            AI Status: {ai_status.title()}<br>
+            <small>First token: {latency} · Errors: {health_snapshot["error_rate"]:.0%}</small>
         </div>
         """, unsafe_allow_html=True)
         
@@ -398,9 +988,10 @@ def main():
                 st.session_state.custom_character = st.text_input("Describe your character:")
         
         # Game Stats
-        if st.session_state.game_session:
+        memory_slot = None
+        session = get_game_session()
+        if session:
             st.markdown("### 📊 Session Stats")
-            session = st.session_state.game_session
             
             col1, col2 = st.columns(2)
             with col1:
@@ -422,12 +1013,18 @@ def main():
             # Session time
             elapsed = datetime.now() - session.start_time
             st.metric("Session Time", f"{elapsed.seconds // 60}m {elapsed.seconds % 60}s")
+            memory_slot = st.empty()
         
         # Reset button
         if st.button("🔄 New Game Session"):
-            st.session_state.game_session = GameSession(game_type)
+            start_game_session(game_type)
             st.rerun()
     
+    memory_usage = store.enforce_cap(st.session_state.session_key, st.session_state.games,
+                                     ("game_session", GAME_KEYS.get(game_type)))
+    if memory_slot is not None:
+        memory_slot.metric("Session Memory", f"{memory_usage / 1024:.1f} KB")
+    
     # Main Game Area
     if game_type == "About":
         show_about_page()
@@ -469,50 +1066,82 @@ def show_about_page():
     </div>
     """, unsafe_allow_html=True)
     
-    # Show demo visualization
+    # Playground analytics
+    summary = summarize_analytics(get_session_analytics().size())
+    series = summary["series"]
+    if not len(series["day"]):
+        st.info("No games played yet. Stats will appear here once sessions are logged.")
+        return
+    
     fig = go.Figure()
     fig.add_trace(go.Scatter(
-        x=[1, 2, 3, 4, 5],
-        y=[10, 25, 40, 60, 85],
+        x=series["day"],
+        y=series["score"],
         mode='lines+markers',
-        name='Engagement Level',
+        name='Points Scored',
         line=dict(color='#4CAF50', width=3),
         marker=dict(size=10)
     ))
+    fig.add_trace(go.Bar(
+        x=series["day"],
+        y=series["events"],
+        name='Turns Played',
+        marker_color='rgba(33, 150, 243, 0.5)'
+    ))
     
     fig.update_layout(
-        title="AI Engagement Over Time",
-        xaxis_title="Game Sessions",
-        yaxis_title="Engagement Score",
+        title="Playground Activity Over Time",
+        xaxis_title="Day",
+        yaxis_title="Total",
         template="plotly_dark",
         paper_bgcolor='rgba(0,0,0,0)',
         plot_bgcolor='rgba(0,0,0,0)'
     )
     
     st.plotly_chart(fig, use_container_width=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        averages = summary["averages"]
+        fig = px.bar(
+            x=averages["game"],
+            y=averages["avg_score"],
+            text=[f"{latency:.1f}s" if np.isfinite(latency) else "n/a" for latency in averages["avg_latency"]],
+            labels={"x": "Game", "y": "Avg Points per Turn"},
+            title="Per-Game Averages (label: avg AI latency)",
+            template="plotly_dark"
+        )
+        fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)')
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        st.markdown("### 🏆 Leaderboard")
+        st.table(summary["leaderboard"])
 
 def show_story_adventure():
     """Display story adventure game"""
     st.markdown('<div class="game-container">', unsafe_allow_html=True)
     st.markdown("## 📚 Interactive Story Adventure")
     
-    if not st.session_state.game_session:
-        st.session_state.game_session = GameSession("Story Adventure")
-    
-    story_game = st.session_state.story_game
+    session = get_game_session("Story Adventure")
+    story_game = get_game("story_game")
     
     # Start new story button
     if st.button("🌟 Begin New Adventure"):
-        st.session_state.ai_status = "thinking"
+        start = time.monotonic()
         with st.spinner("AI is crafting your adventure..."):
-            scene = story_game.generate_scene()
-            st.session_state.game_session.add_message("ai", scene)
-            st.session_state.ai_status = "online"
+            scene = story_game.generate_scene(max_output_tokens=output_token_limit(STORY_DEGRADED_TOKENS))
+            session.add_message("ai", scene)
+        session.record_turn("Story Adventure", latency=time.monotonic() - start)
         st.rerun()
     
     # Display conversation
-    if st.session_state.game_session.messages:
-        for msg in st.session_state.game_session.messages:
+    messages = session.messages
+    if (has_archived_history("game_session")
+            and st.checkbox("📜 Show earlier messages", key="story_archive")):
+        messages = get_archived_history("game_session", "messages") + messages
+    if messages:
+        for msg in messages:
             role_class = "ai-message" if msg["role"] == "ai" else "user-message"
             role_icon = "🤖" if msg["role"] == "ai" else "👤"
             
@@ -547,14 +1176,14 @@ def show_story_adventure():
 
 def handle_story_input(choice, story_game):
     """Handle user input in story adventure"""
-    st.session_state.game_session.add_message("user", choice)
-    st.session_state.ai_status = "thinking"
+    session = get_game_session("Story Adventure")
+    session.add_message("user", choice)
     
+    start = time.monotonic()
     with st.spinner("AI is processing your choice..."):
-        response = story_game.generate_scene(choice)
-        st.session_state.game_session.add_message("ai", response)
-        st.session_state.game_session.score += 10
-        st.session_state.ai_status = "online"
+        response = story_game.generate_scene(choice, output_token_limit(STORY_DEGRADED_TOKENS))
+        session.add_message("ai", response)
+    session.record_turn("Story Adventure", 10, time.monotonic() - start)
     
     st.rerun()
 
@@ -563,18 +1192,16 @@ def show_riddle_master():
     st.markdown('<div class="game-container">', unsafe_allow_html=True)
     st.markdown("## 🧩 Riddle Master Challenge")
     
-    if not st.session_state.game_session:
-        st.session_state.game_session = GameSession("Riddle Master")
-    
-    riddle_game = st.session_state.riddle_game
+    session = get_game_session("Riddle Master")
+    riddle_game = get_game("riddle_game")
     
     # Generate new riddle
     if st.button("🎲 New Riddle"):
         difficulty = getattr(st.session_state, 'riddle_difficulty', 'medium')
-        st.session_state.ai_status = "thinking"
+        start = time.monotonic()
         with st.spinner("AI is crafting a riddle..."):
-            riddle = riddle_game.generate_riddle(difficulty)
-            st.session_state.ai_status = "online"
+            riddle = riddle_game.generate_riddle(difficulty, output_token_limit(RIDDLE_DEGRADED_TOKENS))
+        session.record_turn("Riddle Master", latency=time.monotonic() - start)
         st.rerun()
     
     # Display current riddle
@@ -594,8 +1221,8 @@ def show_riddle_master():
             if st.button("✅ Submit Answer") and user_answer:
                 if riddle_game.check_answer(user_answer):
                     st.success("🎉 Correct! Well done!")
-                    st.session_state.game_session.score += 50
-                    st.session_state.game_session.level += 1
+                    session.record_turn("Riddle Master", 50)
+                    session.level += 1
                     st.balloons()
                 else:
                     st.error("❌ Not quite right. Try again!")
@@ -612,10 +1239,8 @@ def show_roleplay_chat():
     st.markdown('<div class="game-container">', unsafe_allow_html=True)
     st.markdown("## 🎭 Role Play Adventure")
     
-    if not st.session_state.game_session:
-        st.session_state.game_session = GameSession("Role Play Chat")
-    
-    roleplay_game = st.session_state.roleplay_game
+    session = get_game_session("Role Play Chat")
+    roleplay_game = get_game("roleplay_game")
     
     # Character selection
     character_type = getattr(st.session_state, 'rp_character', 'Wise Wizard')
@@ -640,11 +1265,17 @@ def show_roleplay_chat():
     # Initialize character
     if st.button("🎬 Start Roleplay"):
         roleplay_game.set_character(character, scenario)
-        st.session_state.game_session.add_message("system", f"Roleplay started with {character}")
+        get_session_store().put(st.session_state.session_key, st.session_state.games,
+                                "roleplay_game", roleplay_game)
+        session.add_message("system", f"Roleplay started with {character}")
         st.rerun()
     
     # Display conversation
-    for msg in roleplay_game.conversation_history:
+    history = roleplay_game.conversation_history
+    if (has_archived_history("roleplay_game")
+            and st.checkbox("📜 Show earlier messages", key="roleplay_archive")):
+        history = get_archived_history("roleplay_game", "conversation_history") + history
+    for msg in history:
         st.markdown(f"""
         <div class="chat-message user-message">
             <strong>👤 You:</strong><br>
@@ -660,11 +1291,10 @@ def show_roleplay_chat():
     user_message = st.text_input("What do you say or do?", key="roleplay_input")
     
     if st.button("💬 Send Message") and user_message:
-        st.session_state.ai_status = "thinking"
+        start = time.monotonic()
         with st.spinner(f"{character} is responding..."):
-            response = roleplay_game.chat(user_message)
-            st.session_state.game_session.score += 5
-            st.session_state.ai_status = "online"
+            response = roleplay_game.chat(user_message, output_token_limit(ROLEPLAY_DEGRADED_TOKENS))
+        session.record_turn("Role Play Chat", 5, time.monotonic() - start)
         st.rerun()
     
     st.markdown('</div>', unsafe_allow_html=True)
@@ -674,18 +1304,16 @@ def show_word_association():
     st.markdown('<div class="game-container">', unsafe_allow_html=True)
     st.markdown("## 🔤 Word Association Challenge")
     
-    if not st.session_state.game_session:
-        st.session_state.game_session = GameSession("Word Association")
-    
-    word_game = st.session_state.word_game
+    session = get_game_session("Word Association")
+    word_game = get_game("word_game")
     
     # Start game
     if st.button("🚀 Start Word Game"):
-        st.session_state.ai_status = "thinking"
+        start = time.monotonic()
         with st.spinner("AI is picking a starting word..."):
-            start_word = word_game.start_word_association()
-            st.session_state.ai_status = "online"
+            start_word = word_game.start_word_association(output_token_limit(WORD_START_DEGRADED_TOKENS))
             st.info(f"Starting word: **{start_word.upper()}**")
+        session.record_turn("Word Association", latency=time.monotonic() - start)
         st.rerun()
     
     # Display current word and stats
@@ -702,16 +1330,17 @@ def show_word_association():
         user_word = st.text_input("Enter an associated word:", key="word_input")
         
         if st.button("🔗 Check Association") and user_word:
-            st.session_state.ai_status = "thinking"
+            start = time.monotonic()
             with st.spinner("AI is checking association..."):
-                is_valid, explanation = word_game.check_association(user_word)
-                st.session_state.ai_status = "online"
+                is_valid, explanation = word_game.check_association(user_word, output_token_limit(WORD_CHECK_DEGRADED_TOKENS))
+                latency = time.monotonic() - start
                 
                 if is_valid:
                     st.success(f"✅ Great association! {explanation}")
-                    st.session_state.game_session.score += 10
+                    session.record_turn("Word Association", 10, latency)
                 else:
                     st.error(f"❌ {explanation}")
+                    session.record_turn("Word Association", 0, latency)
             
             st.rerun()
     